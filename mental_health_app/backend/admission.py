@@ -0,0 +1,271 @@
+import math
+import os
+from abc import ABC, abstractmethod
+import threading
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, Request, status, Depends
+from dotenv import load_dotenv
+from database import User
+from auth import get_current_user
+
+load_dotenv()
+
+# Global cap on expensive requests in flight in this worker (or across workers
+# when a shared store is configured)
+GLOBAL_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_GLOBAL_MAX_IN_FLIGHT", "32"))
+# Share of global capacity held back for short requests once the app is busy
+SHORT_REQUEST_RESERVE = float(os.getenv("ADMISSION_SHORT_REQUEST_RESERVE", "0.25"))
+# Requests with a body up to this many bytes count as short
+SHORT_REQUEST_BYTES = int(os.getenv("ADMISSION_SHORT_REQUEST_BYTES", "512"))
+# Set to share admission state across workers (requires the redis package)
+ADMISSION_REDIS_URL = os.getenv("ADMISSION_REDIS_URL")
+# How often the in-process store drops buckets that have refilled completely
+BUCKET_SWEEP_SECONDS = float(os.getenv("ADMISSION_BUCKET_SWEEP_SECONDS", "60"))
+
+class AdmissionPolicy:
+    def __init__(self, name: str, rate: float, burst: int, max_concurrent: int):
+        self.name = name
+        self.rate = rate  # tokens refilled per second
+        self.burst = burst  # bucket size
+        self.max_concurrent = max_concurrent  # per user
+
+class AdmissionStore(ABC):
+    """Storage for token buckets and in-flight counters"""
+
+    @abstractmethod
+    def take_token(self, key: str, rate: float, burst: int) -> float:
+        """Take one token; return 0 if allowed, else seconds until a token is available"""
+
+    @abstractmethod
+    def try_acquire(self, key: str, limit: int) -> Optional[str]:
+        """Take an in-flight slot for key unless limit are taken; return its id, or None"""
+
+    @abstractmethod
+    def release(self, key: str, slot: str):
+        """Give back a slot returned by try_acquire"""
+
+class InMemoryAdmissionStore(AdmissionStore):
+    """Per-process store; limits apply to each worker separately"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (tokens, last refill, time the bucket is full again)
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._last_sweep = time.monotonic()
+
+    def take_token(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            tokens, last, _ = self._buckets.get(key, (float(burst), now, now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            return wait
+
+    def _sweep(self, now: float):
+        """Drop full buckets; a missing bucket behaves exactly like a full one"""
+        if now - self._last_sweep < BUCKET_SWEEP_SECONDS:
+            return
+        self._last_sweep = now
+        for key in [key for key, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+
+    def try_acquire(self, key: str, limit: int) -> Optional[str]:
+        with self._lock:
+            current = self._in_flight.get(key, 0)
+            if current >= limit:
+                return None
+            self._in_flight[key] = current + 1
+            # Slots are only counted in-process; the id is not needed to release one
+            return ""
+
+    def release(self, key: str, slot: str):
+        with self._lock:
+            current = self._in_flight.get(key, 0) - 1
+            if current > 0:
+                self._in_flight[key] = current
+            else:
+                self._in_flight.pop(key, None)
+
+class RedisAdmissionStore(AdmissionStore):
+    """Store shared by all workers pointing at the same Redis"""
+
+    # Token bucket refilled from Redis server time so workers agree on the clock
+    TOKEN_BUCKET_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'last')
+    local tokens = tonumber(bucket[1]) or burst
+    local last = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + (now - last) * rate)
+    local wait = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        wait = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'last', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    # Each in-flight request is a member of a sorted set scored by when it started.
+    # Members older than the TTL are dropped, so slots held by a crashed worker free
+    # themselves; the TTL must exceed the longest request (including chat streaming).
+    ACQUIRE_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local limit = tonumber(ARGV[1])
+    local ttl = tonumber(ARGV[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+    if redis.call('ZCARD', KEYS[1]) >= limit then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('EXPIRE', KEYS[1], math.ceil(ttl))
+    return 1
+    """
+
+    IN_FLIGHT_TTL_SECONDS = 300
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("ADMISSION_REDIS_URL is set but the redis package is not installed")
+        self._redis = redis.Redis.from_url(url)
+        self._take_token = self._redis.register_script(self.TOKEN_BUCKET_SCRIPT)
+        self._acquire = self._redis.register_script(self.ACQUIRE_SCRIPT)
+
+    def take_token(self, key: str, rate: float, burst: int) -> float:
+        return float(self._take_token(keys=[f"admission:bucket:{key}"], args=[rate, burst]))
+
+    def try_acquire(self, key: str, limit: int) -> Optional[str]:
+        slot = uuid.uuid4().hex
+        acquired = self._acquire(
+            keys=[f"admission:in_flight:{key}"], args=[limit, self.IN_FLIGHT_TTL_SECONDS, slot]
+        )
+        return slot if int(acquired) else None
+
+    def release(self, key: str, slot: str):
+        self._redis.zrem(f"admission:in_flight:{key}", slot)
+
+class AdmissionController:
+    def __init__(self, store: AdmissionStore):
+        self.store = store
+
+    def admit(self, policy: AdmissionPolicy, client_key: str, request_bytes: Optional[int]) -> list:
+        """
+        Admit a request or raise 429/503 with Retry-After.
+        Returns the in-flight slots held by the request, to be passed to release().
+        Slots are checked before the rate limit, so a rejected request never costs a token.
+        """
+        user_key = f"{policy.name}:{client_key}"
+        user_slot = self.store.try_acquire(user_key, policy.max_concurrent)
+        if user_slot is None:
+            raise self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS, "Too many concurrent requests", 1
+            )
+
+        global_slot = self.store.try_acquire("global", self._global_limit(request_bytes))
+        if global_slot is None:
+            self.store.release(user_key, user_slot)
+            raise self._reject(
+                status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry", 1
+            )
+
+        held = [(user_key, user_slot), ("global", global_slot)]
+        wait = self.store.take_token(user_key, policy.rate, policy.burst)
+        if wait > 0:
+            self.release(held)
+            raise self._reject(
+                status.HTTP_429_TOO_MANY_REQUESTS, "Rate limit exceeded", wait
+            )
+
+        return held
+
+    def release(self, held: list):
+        for key, slot in held:
+            self.store.release(key, slot)
+
+    def _global_limit(self, request_bytes: Optional[int]) -> int:
+        """Short requests may use the full capacity; long ones leave a reserve for them"""
+        if request_bytes is not None and request_bytes <= SHORT_REQUEST_BYTES:
+            return GLOBAL_MAX_IN_FLIGHT
+        return max(1, int(GLOBAL_MAX_IN_FLIGHT * (1 - SHORT_REQUEST_RESERVE)))
+
+    def _reject(self, status_code: int, detail: str, retry_after: float) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+def create_store() -> AdmissionStore:
+    if ADMISSION_REDIS_URL:
+        return RedisAdmissionStore(ADMISSION_REDIS_URL)
+    return InMemoryAdmissionStore()
+
+admission_controller = AdmissionController(create_store())
+
+CHAT_POLICY = AdmissionPolicy(
+    "chat",
+    rate=float(os.getenv("ADMISSION_CHAT_RATE", "0.5")),
+    burst=int(os.getenv("ADMISSION_CHAT_BURST", "5")),
+    max_concurrent=int(os.getenv("ADMISSION_CHAT_MAX_CONCURRENT", "2")),
+)
+ANALYSIS_POLICY = AdmissionPolicy(
+    "analysis",
+    rate=float(os.getenv("ADMISSION_ANALYSIS_RATE", "2")),
+    burst=int(os.getenv("ADMISSION_ANALYSIS_BURST", "10")),
+    max_concurrent=int(os.getenv("ADMISSION_ANALYSIS_MAX_CONCURRENT", "4")),
+)
+
+def _request_bytes(request: Request) -> Optional[int]:
+    """
+    Size of the text a request carries: the body plus query parameter values,
+    which is where GET /emotions/analyze takes its text. None for a chunked
+    body of unknown length.
+    """
+    query_bytes = sum(len(value.encode("utf-8")) for value in request.query_params.values())
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit():
+        return int(content_length) + query_bytes
+    if "chunked" in request.headers.get("transfer-encoding", "").lower():
+        return None
+    # No Content-Length and not chunked means no body, e.g. any GET
+    return query_bytes
+
+def _user_admission(policy: AdmissionPolicy):
+    def dependency(request: Request, current_user: User = Depends(get_current_user)):
+        held = admission_controller.admit(policy, f"user:{current_user.id}", _request_bytes(request))
+        try:
+            yield
+        finally:
+            admission_controller.release(held)
+    return dependency
+
+def _client_admission(policy: AdmissionPolicy):
+    """For unauthenticated endpoints, limits are keyed by client address"""
+    def dependency(request: Request):
+        client = request.client.host if request.client else "unknown"
+        held = admission_controller.admit(policy, f"client:{client}", _request_bytes(request))
+        try:
+            yield
+        finally:
+            admission_controller.release(held)
+    return dependency
+
+admit_chat = _user_admission(CHAT_POLICY)
+admit_analysis = _user_admission(ANALYSIS_POLICY)
+admit_anonymous_analysis = _client_admission(ANALYSIS_POLICY)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Callable, Dict, Any
+from fastapi import HTTPException, Request, Response, Depends
+from dotenv import load_dotenv
+from auth import verify_token
+
+load_dotenv()
+
+# Set to share data versions across workers (requires the redis package)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+STATIC_MAX_AGE_SECONDS = int(os.getenv("STATIC_MAX_AGE_SECONDS", "86400"))
+# Worker count as passed to uvicorn/gunicorn
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+class VersionStore(ABC):
+    """Per-user data version counters, bumped on every write"""
+
+    # Included in every ETag so tags from different stores never collide
+    instance_id = ""
+
+    @abstractmethod
+    def get(self, key: str) -> int:
+        pass
+
+    @abstractmethod
+    def bump(self, key: str):
+        pass
+
+class InMemoryVersionStore(VersionStore):
+    """
+    Per-process counters, only correct with a single worker: a write handled
+    by another worker would not bump this process's counter. The instance id
+    just keeps tags from surviving a restart.
+    """
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+
+    def get(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def bump(self, key: str):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+class RedisVersionStore(VersionStore):
+    """Counters shared by all workers pointing at the same Redis"""
+
+    instance_id = "shared"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise ValueError("CACHE_REDIS_URL is set but the redis package is not installed")
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> int:
+        return int(self._redis.get(f"data_version:{key}") or 0)
+
+    def bump(self, key: str):
+        self._redis.incr(f"data_version:{key}")
+
+def create_version_store() -> VersionStore:
+    if CACHE_REDIS_URL:
+        return RedisVersionStore(CACHE_REDIS_URL)
+    return InMemoryVersionStore()
+
+version_store = create_version_store()
+
+# Per-user ETags need every worker to see every write
+CONDITIONAL_GET_ENABLED = bool(CACHE_REDIS_URL) or WEB_CONCURRENCY <= 1
+if not CONDITIONAL_GET_ENABLED:
+    print("ETags disabled: running several workers without CACHE_REDIS_URL")
+
+def bump_user_version(username: str):
+    """Invalidate every ETag issued for this user's data"""
+    version_store.bump(username)
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def _not_modified(etag: str, cache_control: str) -> HTTPException:
+    return HTTPException(
+        status_code=304,
+        headers={"ETag": etag, "Cache-Control": cache_control},
+    )
+
+def conditional_get(scope: str, per_day: bool = False):
+    """
+    Dependency for per-user read endpoints. The ETag is built from the user's
+    data version and the request path and query, so a matching If-None-Match
+    is answered with 304 before the user is loaded or any query runs.
+    per_day adds the current UTC date, for responses that age without writes.
+    """
+    cache_control = "private, no-cache"
+
+    def dependency(request: Request, response: Response, username: str = Depends(verify_token)):
+        if not CONDITIONAL_GET_ENABLED:
+            return
+        # Read the version before the endpoint queries, so a concurrent write
+        # can only make the tag stale, never the body
+        version = version_store.get(username)
+        day = datetime.utcnow().date().isoformat() if per_day else ""
+        target = hashlib.sha1(
+            f"{request.url.path}?{sorted(request.query_params.multi_items())}{day}".encode()
+        ).hexdigest()[:8]
+        etag = f'W/"{scope}-{version_store.instance_id}-{version}-{target}"'
+        if _etag_matches(request, etag):
+            raise _not_modified(etag, cache_control)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+
+    return dependency
+
+def static_conditional_get(content: Callable[[], Dict[str, Any]]):
+    """Dependency for endpoints whose output never changes while the app runs"""
+    cache_control = f"public, max-age={STATIC_MAX_AGE_SECONDS}"
+    etag = None
+
+    def dependency(request: Request, response: Response):
+        nonlocal etag
+        if etag is None:
+            body = json.dumps(content(), sort_keys=True).encode()
+            etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if _etag_matches(request, etag):
+            raise _not_modified(etag, cache_control)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+
+    return dependency
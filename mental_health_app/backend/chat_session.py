@@ -0,0 +1,101 @@
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Server pings this often; a connection silent for twice as long is closed
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "25"))
+# How long a disconnected session can still be resumed
+WS_SESSION_TTL_SECONDS = float(os.getenv("WS_SESSION_TTL_SECONDS", "300"))
+# Completed responses kept per session for replay after a reconnect
+WS_REPLAY_BUFFER_SIZE = int(os.getenv("WS_REPLAY_BUFFER_SIZE", "20"))
+# Same context window as GeminiService uses
+CONTEXT_MESSAGES = 5
+
+class ChatSession:
+    """State kept for a WebSocket chat across messages and reconnects"""
+
+    def __init__(self, user_id: int, username: str, history: List[Dict[str, str]]):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.username = username
+        self.history = history[-CONTEXT_MESSAGES:]
+        self.seq = 0
+        self._sent: List[Dict[str, Any]] = []
+        self._sender: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+        self.last_active = time.monotonic()
+
+    def touch(self):
+        self.last_active = time.monotonic()
+
+    def remember(self, message: str, response: str):
+        """Add an exchange to the conversation context"""
+        self.history.append({"message": message, "response": response})
+        self.history = self.history[-CONTEXT_MESSAGES:]
+
+    def record(self, frame: Dict[str, Any]) -> Dict[str, Any]:
+        """Number a frame and keep it for replay"""
+        self.seq += 1
+        frame = {**frame, "seq": self.seq}
+        self._sent.append(frame)
+        self._sent = self._sent[-WS_REPLAY_BUFFER_SIZE:]
+        return frame
+
+    def replay(self, last_seq: int) -> List[Dict[str, Any]]:
+        """Frames the client has not acknowledged seeing"""
+        return [frame for frame in self._sent if frame["seq"] > last_seq]
+
+    def attach(self, sender: Callable[[Dict[str, Any]], Awaitable[None]]):
+        """Route frames to the newest connection, so a response still being
+        generated when the client reconnects reaches the new connection"""
+        self._sender = sender
+
+    def detach(self, sender: Callable[[Dict[str, Any]], Awaitable[None]]):
+        if self._sender is sender:
+            self._sender = None
+
+    async def send(self, frame: Dict[str, Any]):
+        if self._sender is not None:
+            await self._sender(frame)
+
+class ChatSessionRegistry:
+    """
+    In-process sessions. A session can only be resumed on the worker that
+    created it, so deployments with several workers need sticky connections.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, ChatSession] = {}
+
+    def create(self, user_id: int, username: str, history: List[Dict[str, str]]) -> ChatSession:
+        session = ChatSession(user_id, username, history)
+        with self._lock:
+            self._prune()
+            self._sessions[session.id] = session
+        return session
+
+    def resume(self, session_id: Optional[str], user_id: int) -> Optional[ChatSession]:
+        if not session_id:
+            return None
+        with self._lock:
+            self._prune()
+            session = self._sessions.get(session_id)
+        if session is None or session.user_id != user_id:
+            return None
+        session.touch()
+        return session
+
+    def _prune(self):
+        cutoff = time.monotonic() - WS_SESSION_TTL_SECONDS
+        for session_id in [
+            session_id for session_id, session in self._sessions.items()
+            if session.last_active < cutoff
+        ]:
+            del self._sessions[session_id]
+
+chat_sessions = ChatSessionRegistry()
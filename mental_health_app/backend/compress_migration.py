@@ -0,0 +1,201 @@
+"""
+Compress existing rows of CompressedText columns.
+
+    python compress_migration.py            # train a dictionary if none is active, then convert
+    python compress_migration.py train      # train and activate a new dictionary
+    python compress_migration.py convert    # convert plain rows with the active dictionary
+    python compress_migration.py --dry-run  # report the expected size reduction, write nothing
+"""
+import argparse
+import os
+import time
+from typing import Dict, Any, List, Optional
+from sqlalchemy import select, update, bindparam, type_coerce, Text, LargeBinary
+from dotenv import load_dotenv
+from database import (
+    engine, SessionLocal, DiaryEntry, ChatMessage, ArchivedChatMessage, CompressionDictionary,
+    init_db
+)
+from compression import (
+    compress_text, decompress_text, is_compressed, train_dictionary,
+    register_dictionary, active_dictionary_id
+)
+
+load_dotenv()
+
+MIGRATION_BATCH_SIZE = int(os.getenv("COMPRESSION_BATCH_SIZE", "500"))
+MIGRATION_BATCH_PAUSE_SECONDS = float(os.getenv("COMPRESSION_BATCH_PAUSE_SECONDS", "0.2"))
+# Number of recent values sampled per column to train the shared dictionary
+TRAINING_SAMPLE_ROWS = int(os.getenv("COMPRESSION_TRAINING_SAMPLE_ROWS", "2000"))
+# Below these, a trained dictionary would be no better than none, so the current one is kept
+MIN_TRAINING_SAMPLES = int(os.getenv("COMPRESSION_MIN_TRAINING_SAMPLES", "100"))
+MIN_DICTIONARY_BYTES = 1024
+# Id under which a dry run registers its dictionary in memory; never stored
+DRY_RUN_DICTIONARY_ID = 0xFFFF
+
+COLUMNS = [
+    (DiaryEntry, "content"),
+    (ChatMessage, "message"),
+    (ChatMessage, "response"),
+    (ArchivedChatMessage, "message"),
+    (ArchivedChatMessage, "response"),
+]
+
+def _storage_type():
+    return Text() if engine.dialect.name == "sqlite" else LargeBinary()
+
+def _raw(model, column_name: str):
+    # Bypass CompressedText so values come back exactly as stored
+    return type_coerce(model.__table__.c[column_name], _storage_type())
+
+def train(db, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Train a dictionary on recent values, compressed or not. It becomes the active
+    dictionary unless there is too little data, in which case the current one stays.
+    A dry run only registers it in memory for measuring.
+    """
+    samples: List[str] = []
+    for model, column_name in COLUMNS:
+        rows = db.execute(
+            select(_raw(model, column_name))
+            .order_by(model.__table__.c.id.desc())
+            .limit(TRAINING_SAMPLE_ROWS)
+        ).scalars()
+        samples.extend(decompress_text(value) for value in rows if value)
+
+    report = {"samples": len(samples), "trained": False, "dictionary_id": active_dictionary_id()}
+    if len(samples) < MIN_TRAINING_SAMPLES:
+        return report
+    data = train_dictionary(samples)
+    if len(data) < MIN_DICTIONARY_BYTES:
+        return report
+
+    if dry_run:
+        register_dictionary(DRY_RUN_DICTIONARY_ID, data)
+        dictionary_id = DRY_RUN_DICTIONARY_ID
+    else:
+        dictionary = CompressionDictionary(data=data, active=True)
+        db.query(CompressionDictionary).update({CompressionDictionary.active: False})
+        db.add(dictionary)
+        db.commit()
+        register_dictionary(dictionary.id, data, active=True)
+        dictionary_id = dictionary.id
+
+    report.update({"trained": True, "dictionary_id": dictionary_id, "dictionary_bytes": len(data)})
+    return report
+
+def compress_column(
+    db, model, column_name: str, dictionary_id: int, dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Compress plain values of one column, one committed batch at a time.
+    Each row is only rewritten if it still holds the value that was read,
+    so edits made while the migration runs are kept (and left plain).
+    """
+    table = model.__table__
+    statement = (
+        update(table)
+        .where(
+            table.c.id == bindparam("row_id"),
+            _raw(model, column_name) == bindparam("old_value", type_=_storage_type())
+        )
+        .values({column_name: bindparam("value", type_=LargeBinary)})
+    )
+    report = {"rows_converted": 0, "bytes_before": 0, "bytes_after": 0}
+    last_id = 0
+
+    while True:
+        rows = db.execute(
+            select(table.c.id, _raw(model, column_name))
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(MIGRATION_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        for row_id, value in rows:
+            if not value or is_compressed(value):
+                continue
+            text = decompress_text(value)
+            compressed = compress_text(text, force=True, dictionary_id=dictionary_id)
+            if not isinstance(compressed, bytes):
+                continue
+            if not dry_run:
+                # executemany only reports a total rowcount, so rows are updated one by one
+                result = db.execute(
+                    statement, {"row_id": row_id, "old_value": value, "value": compressed}
+                )
+                if result.rowcount != 1:
+                    continue
+            report["rows_converted"] += 1
+            report["bytes_before"] += len(text.encode("utf-8"))
+            report["bytes_after"] += len(compressed)
+
+        if not dry_run:
+            db.commit()
+        time.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    return report
+
+def run_migration(command: Optional[str] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    command is "train", "convert", or None to train only when no dictionary
+    is active yet and then convert, so reruns just pick up new plain rows.
+    """
+    init_db()
+    db = SessionLocal()
+    try:
+        training = None
+        if command == "train" or (command is None and not active_dictionary_id()):
+            training = train(db, dry_run)
+        if command == "train":
+            return {"dry_run": dry_run, "training": training}
+
+        dictionary_id = training["dictionary_id"] if training else active_dictionary_id()
+        columns = {
+            f"{model.__tablename__}.{column_name}": compress_column(
+                db, model, column_name, dictionary_id, dry_run
+            )
+            for model, column_name in COLUMNS
+        }
+    finally:
+        db.close()
+
+    bytes_before = sum(column["bytes_before"] for column in columns.values())
+    bytes_after = sum(column["bytes_after"] for column in columns.values())
+    return {
+        "dry_run": dry_run,
+        "training": training,
+        "dictionary_id": dictionary_id,
+        "columns": columns,
+        "bytes_before": bytes_before,
+        "bytes_after": bytes_after,
+        "bytes_saved": bytes_before - bytes_after,
+        "ratio": round(bytes_after / bytes_before, 3) if bytes_before else None
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress existing text columns")
+    parser.add_argument("command", nargs="?", choices=["train", "convert"])
+    parser.add_argument("--dry-run", action="store_true", help="report savings without writing")
+    args = parser.parse_args()
+
+    report = run_migration(args.command, dry_run=args.dry_run)
+    training = report["training"]
+    if training:
+        if training["trained"]:
+            print(f"Trained dictionary ({training['dictionary_bytes']} bytes from {training['samples']} samples)")
+        else:
+            print(f"Not enough data to train ({training['samples']} samples), keeping the current dictionary")
+    for name, column in report.get("columns", {}).items():
+        print(
+            f"{name}: {column['rows_converted']} rows, "
+            f"{column['bytes_before']} -> {column['bytes_after']} bytes"
+        )
+    if "columns" in report:
+        print(
+            f"Total: {report['bytes_before']} -> {report['bytes_after']} bytes "
+            f"(saved {report['bytes_saved']}, ratio {report['ratio']})"
+        )
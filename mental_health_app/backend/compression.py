@@ -0,0 +1,149 @@
+import os
+import struct
+import threading
+import zlib
+from collections import Counter
+from typing import Callable, Dict, Iterable, Optional
+from sqlalchemy.types import TypeDecorator, Text, LargeBinary
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Opt-in: when disabled, CompressedText columns read and write plain text, and
+# only rows converted by compress_migration.py are stored compressed
+COMPRESS_TEXT_COLUMNS = os.getenv("COMPRESS_TEXT_COLUMNS", "false").lower() == "true"
+# Values shorter than this are not worth the header and are stored as plain text
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "128"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+# zlib only looks back 32KB, so a larger preset dictionary is wasted
+DICTIONARY_SIZE = 32 * 1024
+
+# Compressed values are stored as bytes: MAGIC, dictionary id, zlib stream.
+# Dictionary id 0 means no preset dictionary.
+MAGIC = b"\x00zt"
+HEADER = struct.Struct(">3sH")
+
+_dictionaries: Dict[int, bytes] = {}
+_dictionaries_lock = threading.Lock()
+_active_dictionary_id = 0
+_dictionary_loader: Optional[Callable[[int], Optional[bytes]]] = None
+
+def set_dictionary_loader(loader: Callable[[int], Optional[bytes]]):
+    """Register a function that fetches a dictionary by id when it is not loaded yet"""
+    global _dictionary_loader
+    _dictionary_loader = loader
+
+def register_dictionary(dictionary_id: int, data: bytes, active: bool = False):
+    global _active_dictionary_id
+    with _dictionaries_lock:
+        _dictionaries[dictionary_id] = data
+        if active:
+            _active_dictionary_id = dictionary_id
+
+def active_dictionary_id() -> int:
+    return _active_dictionary_id
+
+def _get_dictionary(dictionary_id: int) -> bytes:
+    if dictionary_id not in _dictionaries:
+        data = _dictionary_loader(dictionary_id) if _dictionary_loader else None
+        if data is None:
+            raise ValueError(f"Compression dictionary {dictionary_id} not found")
+        register_dictionary(dictionary_id, data)
+    return _dictionaries[dictionary_id]
+
+def is_compressed(value) -> bool:
+    return isinstance(value, (bytes, memoryview)) and bytes(value[:len(MAGIC)]) == MAGIC
+
+def compress_text(value: str, force: bool = False, dictionary_id: Optional[int] = None):
+    """
+    Compress value with the given dictionary, the active one by default. Returns
+    the original string when compression is disabled (unless forced), the value
+    is short, or it would not shrink.
+    """
+    if (not COMPRESS_TEXT_COLUMNS and not force) or value is None:
+        return value
+    raw = value.encode("utf-8")
+    if len(raw) < COMPRESSION_MIN_BYTES:
+        return value
+
+    if dictionary_id is None:
+        dictionary_id = _active_dictionary_id
+    if dictionary_id:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=_get_dictionary(dictionary_id))
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    compressed = HEADER.pack(MAGIC, dictionary_id) + compressor.compress(raw) + compressor.flush()
+    if len(compressed) >= len(raw):
+        return value
+    return compressed
+
+def decompress_text(value):
+    """Inverse of compress_text; plain strings are returned unchanged"""
+    if value is None or isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value.startswith(MAGIC):
+        return value.decode("utf-8")
+
+    _, dictionary_id = HEADER.unpack_from(value)
+    if dictionary_id:
+        decompressor = zlib.decompressobj(zdict=_get_dictionary(dictionary_id))
+    else:
+        decompressor = zlib.decompressobj()
+    data = value[HEADER.size:]
+    return (decompressor.decompress(data) + decompressor.flush()).decode("utf-8")
+
+def train_dictionary(samples: Iterable[str], size: int = DICTIONARY_SIZE) -> bytes:
+    """
+    Build a zlib preset dictionary from the phrases that recur most across samples.
+    The most valuable phrases go last, where zlib reaches them with the shortest distances.
+    """
+    counts = Counter()
+    for text in samples:
+        words = text.split()
+        for n in (2, 3, 4, 6):
+            for i in range(len(words) - n + 1):
+                counts[" ".join(words[i:i + n])] += 1
+
+    ranked = sorted(
+        (phrase for phrase, count in counts.items() if count > 1),
+        key=lambda phrase: counts[phrase] * len(phrase),
+        reverse=True
+    )
+    chosen = []
+    total = 0
+    for phrase in ranked:
+        encoded = phrase.encode("utf-8") + b" "
+        if total + len(encoded) > size:
+            break
+        chosen.append(encoded)
+        total += len(encoded)
+    return b"".join(reversed(chosen))
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored zlib-compressed once it is long enough to benefit.
+    Rows written as plain text (before compression was enabled) read back unchanged,
+    so existing tables can be converted gradually with compress_migration.py.
+
+    SQLite stores compressed bytes in the existing TEXT column. Other databases
+    use a binary column (e.g. bytea on Postgres) holding UTF-8 or compressed
+    bytes; existing text columns must be converted first, e.g.
+    ALTER TABLE chat_messages ALTER COLUMN response TYPE bytea USING convert_to(response, 'UTF8')
+    """
+    impl = Text
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == "sqlite":
+            return dialect.type_descriptor(Text())
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        value = compress_text(value)
+        if isinstance(value, str) and dialect.name != "sqlite":
+            return value.encode("utf-8")
+        return value
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
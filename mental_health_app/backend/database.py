@@ -1,9 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Float, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Float, ForeignKey, Index, LargeBinary, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import os
 from dotenv import load_dotenv
+from compression import CompressedText, register_dictionary, set_dictionary_loader
 
 load_dotenv()
 
@@ -32,7 +33,7 @@ class DiaryEntry(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    content = Column(Text)
+    content = Column(CompressedText)
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
     
@@ -42,13 +43,29 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
     
     id = Column(Integer, primary_key=True, index=True)
-    message = Column(Text)
-    response = Column(Text)
+    message = Column(CompressedText)
+    response = Column(CompressedText)
     created_at = Column(DateTime, default=datetime.utcnow)
     user_id = Column(Integer, ForeignKey("users.id"))
     
     user = relationship("User", back_populates="chat_messages")
 
+class ArchivedChatMessage(Base):
+    """Chat messages moved out of chat_messages by the retention job (see retention.py)"""
+    __tablename__ = "archived_chat_messages"
+    
+    # Same id as the original chat message, so EmotionScore.content_id still links to it
+    id = Column(Integer, primary_key=True)
+    message = Column(CompressedText)
+    response = Column(CompressedText)
+    created_at = Column(DateTime)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_archived_chat_messages_user_created", "user_id", "created_at"),
+    )
+
 class EmotionScore(Base):
     __tablename__ = "emotion_scores"
     
@@ -61,6 +78,25 @@ class EmotionScore(Base):
     
     user = relationship("User", back_populates="emotion_scores")
 
+class CompressionDictionary(Base):
+    """Preset zlib dictionaries referenced by compressed CompressedText values"""
+    __tablename__ = "compression_dictionaries"
+    
+    id = Column(Integer, primary_key=True)
+    data = Column(LargeBinary)
+    active = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+def _load_dictionary(dictionary_id: int):
+    db = SessionLocal()
+    try:
+        dictionary = db.get(CompressionDictionary, dictionary_id)
+        return dictionary.data if dictionary else None
+    finally:
+        db.close()
+
+set_dictionary_loader(_load_dictionary)
+
 def get_db():
     db = SessionLocal()
     try:
@@ -69,4 +105,17 @@ def get_db():
         db.close()
 
 def create_tables():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    Base.metadata.create_all(bind=engine)
+
+def load_compression_dictionaries():
+    """Load the active compression dictionary so new values are compressed with it"""
+    db = SessionLocal()
+    try:
+        for dictionary in db.query(CompressionDictionary).filter(CompressionDictionary.active == True):
+            register_dictionary(dictionary.id, dictionary.data, active=True)
+    finally:
+        db.close()
+
+def init_db():
+    create_tables()
+    load_compression_dictionaries()
\ No newline at end of file
@@ -1,18 +1,18 @@
-import google.generativeai as genai
 import os
+import threading
 from dotenv import load_dotenv
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator
 
 load_dotenv()
 
 class GeminiService:
+    FALLBACK_RESPONSE = "I apologize, but I'm having trouble responding right now. Please try again later, and remember that if you're in crisis, please contact a mental health professional or emergency services."
+
     def __init__(self):
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-pro')
+        # The Gemini client is heavy to import, so it is built on first use
+        # (or by warm_up during startup) rather than at import time
+        self.model = None
+        self._model_lock = threading.Lock()
         
         self.system_prompt = """
         You are a compassionate and professional mental health support chatbot. Your role is to:
@@ -34,24 +34,62 @@ class GeminiService:
         Remember: You are a supportive companion, not a replacement for professional mental health care.
         """
     
+    def _get_model(self):
+        """Configure the Gemini client and build the model on first use"""
+        if self.model is None:
+            with self._model_lock:
+                if self.model is None:
+                    api_key = os.getenv("GEMINI_API_KEY")
+                    if not api_key:
+                        raise ValueError("GEMINI_API_KEY not found in environment variables")
+                    
+                    import google.generativeai as genai
+                    genai.configure(api_key=api_key)
+                    self.model = genai.GenerativeModel('gemini-pro')
+        return self.model
+    
+    def warm_up(self):
+        """Import and configure the Gemini client ahead of the first chat"""
+        self._get_model()
+    
+    def _build_prompt(self, user_message: str, conversation_history: list = None) -> str:
+        # Prepare the conversation context
+        full_prompt = self.system_prompt + "\n\n"
+        
+        if conversation_history:
+            for msg in conversation_history[-5:]:  # Last 5 messages for context
+                full_prompt += f"User: {msg.get('message', '')}\n"
+                full_prompt += f"Assistant: {msg.get('response', '')}\n"
+        
+        full_prompt += f"User: {user_message}\nAssistant:"
+        return full_prompt
+    
     async def get_response(self, user_message: str, conversation_history: list = None) -> str:
         try:
-            # Prepare the conversation context
-            full_prompt = self.system_prompt + "\n\n"
-            
-            if conversation_history:
-                for msg in conversation_history[-5:]:  # Last 5 messages for context
-                    full_prompt += f"User: {msg.get('message', '')}\n"
-                    full_prompt += f"Assistant: {msg.get('response', '')}\n"
-            
-            full_prompt += f"User: {user_message}\nAssistant:"
-            
-            response = self.model.generate_content(full_prompt)
+            full_prompt = self._build_prompt(user_message, conversation_history)
+            response = self._get_model().generate_content(full_prompt)
             return response.text
             
         except Exception as e:
             print(f"Error generating response: {e}")
-            return "I apologize, but I'm having trouble responding right now. Please try again later, and remember that if you're in crisis, please contact a mental health professional or emergency services."
+            return self.FALLBACK_RESPONSE
+    
+    async def stream_response(self, user_message: str, conversation_history: list = None) -> AsyncIterator[str]:
+        """Yield the response in chunks as Gemini generates it"""
+        sent_any = False
+        try:
+            full_prompt = self._build_prompt(user_message, conversation_history)
+            response = await self._get_model().generate_content_async(full_prompt, stream=True)
+            async for chunk in response:
+                if chunk.text:
+                    sent_any = True
+                    yield chunk.text
+                    
+        except Exception as e:
+            print(f"Error streaming response: {e}")
+            # Keep a partial answer rather than appending an apology to it
+            if not sent_any:
+                yield self.FALLBACK_RESPONSE
     
     def get_mental_health_tips(self) -> Dict[str, Any]:
         """Return general mental health tips and resources"""
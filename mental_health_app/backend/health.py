@@ -0,0 +1,143 @@
+import asyncio
+import os
+import time
+from typing import Callable, Dict, Any, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Budgets for a cold start, in seconds. Exceeding them does not stop the app,
+# but is reported by the readiness endpoint and logged on startup.
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "1.5"))
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "10"))
+# Failed warm-ups are retried with exponential backoff between these delays
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", "1"))
+WARM_UP_RETRY_MAX_SECONDS = float(os.getenv("WARM_UP_RETRY_MAX_SECONDS", "60"))
+# A required subsystem still failing after this many attempts fails the liveness
+# probe, so the orchestrator restarts the worker instead of leaving it unready
+WARM_UP_MAX_ATTEMPTS = int(os.getenv("WARM_UP_MAX_ATTEMPTS", "5"))
+
+class Subsystem:
+    def __init__(self, name: str, warm_up: Callable[[], None], required: bool = True):
+        self.name = name
+        self.warm_up = warm_up
+        self.required = required
+        self.state = "pending"  # pending -> warming -> ready | failed
+        self.error: Optional[str] = None
+        self.duration: Optional[float] = None
+        self.attempts = 0
+
+    def run(self):
+        """Run the warm-up hook and record its outcome"""
+        self.state = "warming"
+        self.attempts += 1
+        started = time.perf_counter()
+        try:
+            self.warm_up()
+            self.state = "ready"
+            self.error = None
+        except Exception as e:
+            print(f"Error warming up {self.name}: {e}")
+            self.state = "failed"
+            self.error = str(e)
+        finally:
+            self.duration = round(time.perf_counter() - started, 3)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "required": self.required,
+            "error": self.error,
+            "attempts": self.attempts,
+            "warm_up_seconds": self.duration
+        }
+
+class HealthRegistry:
+    def __init__(self):
+        self.subsystems: Dict[str, Subsystem] = {}
+        self.import_time: Optional[float] = None
+        self.startup_time: Optional[float] = None
+        self._startup_started: Optional[float] = None
+
+    def register(self, name: str, warm_up: Callable[[], None], required: bool = True):
+        self.subsystems[name] = Subsystem(name, warm_up, required)
+
+    async def warm_up(self, name: str):
+        """Warm up a single subsystem in a worker thread"""
+        await asyncio.to_thread(self.subsystems[name].run)
+
+    async def warm_up_all(self):
+        """Warm up every pending subsystem concurrently and record the startup time"""
+        pending = [
+            name for name, subsystem in self.subsystems.items()
+            if subsystem.state == "pending"
+        ]
+        await asyncio.gather(*(self.warm_up(name) for name in pending))
+        if self._startup_started is not None:
+            self.startup_time = round(time.perf_counter() - self._startup_started, 3)
+            if self.startup_time > STARTUP_BUDGET_SECONDS:
+                print(
+                    f"Startup took {self.startup_time}s, "
+                    f"over the {STARTUP_BUDGET_SECONDS}s budget"
+                )
+
+    async def retry_failed(self):
+        """Warm up failed subsystems again, backing off, until none is left failing"""
+        delay = WARM_UP_RETRY_SECONDS
+        while True:
+            failed = [
+                name for name, subsystem in self.subsystems.items()
+                if subsystem.state == "failed"
+            ]
+            if not failed:
+                return
+            await asyncio.sleep(delay)
+            await asyncio.gather(*(self.warm_up(name) for name in failed))
+            delay = min(delay * 2, WARM_UP_RETRY_MAX_SECONDS)
+
+    def mark_imported(self, import_started: float):
+        self.import_time = round(time.perf_counter() - import_started, 3)
+        if self.import_time > IMPORT_BUDGET_SECONDS:
+            print(
+                f"Importing the app took {self.import_time}s, "
+                f"over the {IMPORT_BUDGET_SECONDS}s budget"
+            )
+
+    def mark_startup_started(self):
+        self._startup_started = time.perf_counter()
+
+    def is_ready(self) -> bool:
+        return all(
+            subsystem.state == "ready"
+            for subsystem in self.subsystems.values()
+            if subsystem.required
+        )
+
+    def is_alive(self) -> bool:
+        """False once a required subsystem has used up its warm-up attempts"""
+        return not any(
+            subsystem.state == "failed" and subsystem.attempts >= WARM_UP_MAX_ATTEMPTS
+            for subsystem in self.subsystems.values()
+            if subsystem.required
+        )
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "subsystems": {
+                name: subsystem.report() for name, subsystem in self.subsystems.items()
+            },
+            "timings": {
+                "import_seconds": self.import_time,
+                "import_budget_seconds": IMPORT_BUDGET_SECONDS,
+                "startup_seconds": self.startup_time,
+                "startup_budget_seconds": STARTUP_BUDGET_SECONDS,
+                "within_budget": (
+                    self.import_time is not None
+                    and self.import_time <= IMPORT_BUDGET_SECONDS
+                    and (self.startup_time is None or self.startup_time <= STARTUP_BUDGET_SECONDS)
+                )
+            }
+        }
+
+health_registry = HealthRegistry()
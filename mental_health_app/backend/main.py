@@ -1,14 +1,22 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, status, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from datetime import timedelta
 from typing import List
 
 # Import local modules
-from database import get_db, create_tables, User, DiaryEntry, ChatMessage, EmotionScore
+from database import get_db, init_db, SessionLocal, User, DiaryEntry, ChatMessage, ArchivedChatMessage, EmotionScore
 from auth import (
     verify_password, get_password_hash, create_access_token, 
-    get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+    get_current_user, decode_token_payload, warm_up_password_hashing, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from schemas import (
     UserCreate, UserLogin, UserResponse, Token, DiaryEntryCreate, 
@@ -18,12 +26,49 @@ from schemas import (
 )
 from gemini_service import gemini_service
 from sentiment_analysis import sentiment_analyzer
+from health import health_registry
+from admission import (
+    admit_chat, admit_analysis, admit_anonymous_analysis, admission_controller, CHAT_POLICY
+)
+from caching import conditional_get, static_conditional_get, bump_user_version
+from retention import retention_loop, CHAT_RETENTION_DAYS
+from chat_session import chat_sessions, ChatSession, WS_HEARTBEAT_SECONDS, CONTEXT_MESSAGES
+
+# Subsystems warmed up on startup; the app is ready once the required ones are.
+# Gemini is optional: chat falls back to a canned reply if it is unavailable.
+health_registry.register("database", init_db)
+health_registry.register("auth", warm_up_password_hashing)
+health_registry.register("sentiment", sentiment_analyzer.warm_up)
+health_registry.register("gemini", gemini_service.warm_up, required=False)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    health_registry.mark_startup_started()
+    # Tables must exist before any request is served; the rest warm up in the background
+    await health_registry.warm_up("database")
+    
+    async def warm_up_in_background():
+        await health_registry.warm_up_all()
+        await health_registry.retry_failed()
+    
+    warm_up_task = asyncio.create_task(warm_up_in_background())
+    retention_stop = threading.Event()
+    retention_task = None
+    if CHAT_RETENTION_DAYS > 0:
+        retention_task = asyncio.create_task(retention_loop(retention_stop))
+    yield
+    retention_stop.set()
+    if retention_task:
+        retention_task.cancel()
+    if not warm_up_task.done():
+        warm_up_task.cancel()
 
 # Create FastAPI app
 app = FastAPI(
     title="Mental Health App API",
     description="A comprehensive mental health support application with chatbot, diary, and emotion tracking",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -35,16 +80,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Create database tables on startup
-@app.on_event("startup")
-def startup_event():
-    create_tables()
-
 # Root endpoint
 @app.get("/")
 def read_root():
     return {"message": "Mental Health App API", "version": "1.0.0"}
 
+# Health endpoints
+@app.get("/health/live")
+def liveness():
+    """The process is up, and no required subsystem has failed past its retries"""
+    if not health_registry.is_alive():
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "failed", "subsystems": health_registry.report()["subsystems"]}
+        )
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness():
+    """Ready once every required subsystem has warmed up"""
+    report = health_registry.report()
+    status_code = status.HTTP_200_OK if report["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(status_code=status_code, content=report)
+
 # Authentication endpoints
 @app.post("/auth/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
@@ -87,12 +145,12 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.get("/auth/me", response_model=UserResponse)
+@app.get("/auth/me", response_model=UserResponse, dependencies=[Depends(conditional_get("me"))])
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Diary endpoints
-@app.post("/diary", response_model=DiaryEntryResponse)
+@app.post("/diary", response_model=DiaryEntryResponse, dependencies=[Depends(admit_analysis)])
 def create_diary_entry(
     entry: DiaryEntryCreate, 
     current_user: User = Depends(get_current_user),
@@ -117,10 +175,11 @@ def create_diary_entry(
     )
     db.add(emotion_score)
     db.commit()
+    bump_user_version(current_user.username)
     
     return db_entry
 
-@app.get("/diary", response_model=List[DiaryEntryResponse])
+@app.get("/diary", response_model=List[DiaryEntryResponse], dependencies=[Depends(conditional_get("diary"))])
 def get_diary_entries(
     skip: int = 0,
     limit: int = 10,
@@ -132,7 +191,7 @@ def get_diary_entries(
     ).offset(skip).limit(limit).all()
     return entries
 
-@app.get("/diary/{entry_id}", response_model=DiaryEntryResponse)
+@app.get("/diary/{entry_id}", response_model=DiaryEntryResponse, dependencies=[Depends(conditional_get("diary_entry"))])
 def get_diary_entry(
     entry_id: int,
     current_user: User = Depends(get_current_user),
@@ -146,7 +205,7 @@ def get_diary_entry(
         raise HTTPException(status_code=404, detail="Diary entry not found")
     return entry
 
-@app.put("/diary/{entry_id}", response_model=DiaryEntryResponse)
+@app.put("/diary/{entry_id}", response_model=DiaryEntryResponse, dependencies=[Depends(admit_analysis)])
 def update_diary_entry(
     entry_id: int,
     entry_update: DiaryEntryUpdate,
@@ -176,6 +235,7 @@ def update_diary_entry(
             emotion_score.score = sentiment_result["score"]
     
     db.commit()
+    bump_user_version(current_user.username)
     db.refresh(entry)
     return entry
 
@@ -201,58 +261,264 @@ def delete_diary_entry(
     
     db.delete(entry)
     db.commit()
+    bump_user_version(current_user.username)
     return {"message": "Diary entry deleted successfully"}
 
 # Chat endpoints
-@app.post("/chat", response_model=ChatResponse)
-async def chat_with_bot(
-    message: ChatMessageCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    # Get recent chat history for context
+def get_recent_history(db: Session, user_id: int) -> List[dict]:
+    """Recent exchanges, oldest first, used as conversation context"""
     recent_chats = db.query(ChatMessage).filter(
-        ChatMessage.user_id == current_user.id
-    ).order_by(ChatMessage.created_at.desc()).limit(5).all()
+        ChatMessage.user_id == user_id
+    ).order_by(ChatMessage.created_at.desc()).limit(CONTEXT_MESSAGES).all()
     
-    conversation_history = [
+    return [
         {"message": chat.message, "response": chat.response}
         for chat in reversed(recent_chats)
     ]
-    
-    # Get response from Gemini
-    bot_response = await gemini_service.get_response(
-        message.message, conversation_history
+
+def to_sentiment_response(sentiment_result: dict) -> SentimentAnalysisResponse:
+    return SentimentAnalysisResponse(
+        sentiment_score=sentiment_result["score"],
+        sentiment_label=sentiment_result["classification"],
+        confidence=sentiment_result["confidence"],
+        emotion_keywords=sentiment_result["keywords_found"]
     )
+
+def save_chat_exchange(db: Session, user_id: int, username: str, message: str, response: str):
+    """Store a chat message and the sentiment score of the user's text in one commit"""
+    # Analyze sentiment of user's message before the write transaction starts,
+    # so the database lock is only held for the inserts
+    sentiment_result = sentiment_analyzer.analyze_sentiment(message)
     
-    # Save chat message
     chat_message = ChatMessage(
-        message=message.message,
-        response=bot_response,
-        user_id=current_user.id
+        message=message,
+        response=response,
+        user_id=user_id
     )
     db.add(chat_message)
-    db.commit()
-    db.refresh(chat_message)
+    db.flush()
+    chat_id = chat_message.id
     
-    # Analyze sentiment of user's message
-    sentiment_result = sentiment_analyzer.analyze_sentiment(message.message)
     emotion_score = EmotionScore(
-        score=sentiment_result["sentiment_score"],
+        score=sentiment_result["score"],
         content_type="chat",
-        content_id=chat_message.id,
-        user_id=current_user.id
+        content_id=chat_id,
+        user_id=user_id
     )
     db.add(emotion_score)
     db.commit()
+    bump_user_version(username)
+    
+    return chat_id, to_sentiment_response(sentiment_result)
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(admit_chat)])
+async def chat_with_bot(
+    message: ChatMessageCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Get recent chat history for context
+    conversation_history = get_recent_history(db, current_user.id)
+    
+    # Get response from Gemini
+    bot_response = await gemini_service.get_response(
+        message.message, conversation_history
+    )
+    
+    chat_id, sentiment_analysis = save_chat_exchange(
+        db, current_user.id, current_user.username, message.message, bot_response
+    )
     
     return ChatResponse(
         response=bot_response,
-        sentiment_analysis=SentimentAnalysisResponse(**sentiment_result),
-        chat_id=chat_message.id
+        sentiment_analysis=sentiment_analysis,
+        chat_id=chat_id
     )
 
-@app.get("/chat/history", response_model=List[ChatMessageResponse])
+async def _receive_frame(websocket: WebSocket, timeout: float) -> dict:
+    """Next JSON frame from the client, text or binary; malformed frames come back empty"""
+    message = await asyncio.wait_for(websocket.receive(), timeout=timeout)
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+    data = message.get("text")
+    if data is None:
+        data = message.get("bytes")
+    try:
+        frame = json.loads(data)
+    except (TypeError, ValueError):
+        return {}
+    return frame if isinstance(frame, dict) else {}
+
+def _authenticate_ws(frame: dict):
+    """Username and expiry (epoch seconds) from an auth frame, or raise 401"""
+    if frame.get("type") != "auth":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    payload = decode_token_payload(str(frame.get("token", "")))
+    expires_at = payload.get("exp")
+    return payload["sub"], float(expires_at) if expires_at is not None else float("inf")
+
+def _open_chat_session(username: str, session_id):
+    """Resume the caller's session or start one with recent history; None if the user is gone"""
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.username == username).first()
+        if user is None:
+            return None
+        session = chat_sessions.resume(session_id, user.id)
+        if session is not None:
+            return session, True
+        return chat_sessions.create(user.id, user.username, get_recent_history(db, user.id)), False
+    finally:
+        db.close()
+
+def _save_ws_exchange(session: ChatSession, text: str, bot_response: str):
+    db = SessionLocal()
+    try:
+        return save_chat_exchange(db, session.user_id, session.username, text, bot_response)
+    finally:
+        db.close()
+
+async def _send_heartbeats(send):
+    while True:
+        await asyncio.sleep(WS_HEARTBEAT_SECONDS)
+        await send({"type": "ping"})
+
+async def _handle_ws_message(session: ChatSession, text, send):
+    if not isinstance(text, str) or not text.strip():
+        await send({"type": "error", "detail": "Message must be a non-empty string"})
+        return
+    
+    try:
+        held = admission_controller.admit(
+            CHAT_POLICY, f"user:{session.user_id}", len(text.encode("utf-8"))
+        )
+    except HTTPException as e:
+        await send({
+            "type": "error",
+            "status": e.status_code,
+            "detail": e.detail,
+            "retry_after": int(e.headers["Retry-After"])
+        })
+        return
+    
+    try:
+        chunks = []
+        async for chunk in gemini_service.stream_response(text, session.history):
+            chunks.append(chunk)
+            await session.send({"type": "chunk", "text": chunk})
+        bot_response = "".join(chunks)
+        
+        # Database and sentiment work run off the event loop
+        chat_id, sentiment_analysis = await asyncio.to_thread(
+            _save_ws_exchange, session, text, bot_response
+        )
+    finally:
+        admission_controller.release(held)
+    
+    session.remember(text, bot_response)
+    await session.send(session.record({
+        "type": "response",
+        "chat_id": chat_id,
+        "response": bot_response,
+        "sentiment_analysis": sentiment_analysis.model_dump()
+    }))
+
+@app.websocket("/ws/chat")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Chat over a persistent connection. The first frame authenticates:
+    {"type": "auth", "token": ..., "session_id": ..., "last_seq": ...}, where
+    session_id and last_seq resume an earlier session and replay missed responses;
+    a response still streaming when the client reconnects continues on the new connection.
+    Then {"type": "message", "message": ...} streams "chunk" frames followed by
+    a numbered "response" frame. Either side may send "ping"; the other answers "pong".
+    The connection is closed with 1008 when the token expires, unless the client
+    sends a new auth frame with a fresh token first.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    connected = True
+    
+    async def send(frame: dict):
+        # After a disconnect, keep going so the response is still saved for replay
+        nonlocal connected
+        if not connected:
+            return
+        try:
+            async with send_lock:
+                await websocket.send_json(frame)
+        except Exception:
+            connected = False
+    
+    # Authenticate once for the whole connection
+    try:
+        auth_frame = await _receive_frame(websocket, WS_HEARTBEAT_SECONDS)
+        username, expires_at = _authenticate_ws(auth_frame)
+    except WebSocketDisconnect:
+        return
+    except (asyncio.TimeoutError, HTTPException):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    opened = await asyncio.to_thread(_open_chat_session, username, auth_frame.get("session_id"))
+    if opened is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    session, resumed = opened
+    
+    # Replay what was recorded so far; anything recorded from here on, including
+    # a response the previous connection was still streaming, is sent live
+    missed = []
+    if resumed:
+        last_seq = auth_frame.get("last_seq")
+        missed = session.replay(last_seq if isinstance(last_seq, int) else 0)
+    session.attach(send)
+    
+    await send({"type": "session", "session_id": session.id, "resumed": resumed})
+    for frame in missed:
+        await send(frame)
+    
+    heartbeat = asyncio.create_task(_send_heartbeats(send))
+    try:
+        while connected:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Token expired")
+                break
+            try:
+                frame = await _receive_frame(websocket, min(WS_HEARTBEAT_SECONDS * 2, remaining))
+            except asyncio.TimeoutError:
+                if expires_at - time.time() > 0:
+                    await websocket.close(code=status.WS_1001_GOING_AWAY)
+                    break
+                continue
+            session.touch()
+            frame_type = frame.get("type")
+            if frame_type == "message" and expires_at > time.time():
+                await _handle_ws_message(session, frame.get("message"), send)
+            elif frame_type == "auth":
+                # Refresh the token without reconnecting; it must name the same user
+                try:
+                    refreshed_username, refreshed_expiry = _authenticate_ws(frame)
+                except HTTPException:
+                    refreshed_username = None
+                if refreshed_username != session.username:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    break
+                expires_at = refreshed_expiry
+                await send({"type": "auth_ok"})
+            elif frame_type == "ping":
+                await send({"type": "pong"})
+            elif frame_type not in ("pong", "message"):
+                await send({"type": "error", "detail": "Unknown frame type"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        heartbeat.cancel()
+        session.detach(send)
+        session.touch()
+
+@app.get("/chat/history", response_model=List[ChatMessageResponse], dependencies=[Depends(conditional_get("chat_history"))])
 def get_chat_history(
     skip: int = 0,
     limit: int = 20,
@@ -264,8 +530,29 @@ def get_chat_history(
     ).order_by(ChatMessage.created_at.desc()).offset(skip).limit(limit).all()
     return messages
 
+@app.get(
+    "/chat/history/archived",
+    response_model=List[ChatMessageResponse],
+    dependencies=[Depends(conditional_get("chat_archive"))]
+)
+def get_archived_chat_history(
+    skip: int = 0,
+    limit: int = 20,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Older chat messages moved out of the main history by the retention job"""
+    messages = db.query(ArchivedChatMessage).filter(
+        ArchivedChatMessage.user_id == current_user.id
+    ).order_by(ArchivedChatMessage.created_at.desc()).offset(skip).limit(limit).all()
+    return messages
+
 # Emotion tracking endpoints
-@app.get("/emotions/trend", response_model=EmotionTrendResponse)
+@app.get(
+    "/emotions/trend",
+    response_model=EmotionTrendResponse,
+    dependencies=[Depends(conditional_get("emotions_trend", per_day=True)), Depends(admit_analysis)]
+)
 def get_emotion_trend(
     days: int = 30,
     current_user: User = Depends(get_current_user),
@@ -299,18 +586,24 @@ def get_emotion_trend(
         scores=formatted_scores
     )
 
-@app.get("/emotions/analyze")
+@app.get("/emotions/analyze", dependencies=[Depends(admit_anonymous_analysis)])
 def analyze_text_sentiment(text: str):
     """Endpoint to analyze sentiment of any text"""
     result = sentiment_analyzer.analyze_sentiment(text)
-    return SentimentAnalysisResponse(**result)
+    return to_sentiment_response(result)
 
 # Mental health resources
-@app.get("/resources", response_model=MentalHealthResources)
+@app.get(
+    "/resources",
+    response_model=MentalHealthResources,
+    dependencies=[Depends(static_conditional_get(gemini_service.get_mental_health_tips))]
+)
 def get_mental_health_resources():
     resources = gemini_service.get_mental_health_tips()
     return MentalHealthResources(**resources)
 
+health_registry.mark_imported(_import_started)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import func, cast, insert, select, delete, text, LargeBinary
+from sqlalchemy.orm import Session
+from dotenv import load_dotenv
+from database import engine, SessionLocal, User, ChatMessage, ArchivedChatMessage, create_tables
+from caching import bump_user_version
+
+load_dotenv()
+
+# Chat messages older than this many days move to the archive table (0 disables the job)
+CHAT_RETENTION_DAYS = int(os.getenv("CHAT_RETENTION_DAYS", "90"))
+RETENTION_INTERVAL_SECONDS = int(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+# Pause between batches so the job never holds the database for long
+RETENTION_BATCH_PAUSE_SECONDS = float(os.getenv("RETENTION_BATCH_PAUSE_SECONDS", "0.5"))
+# Archived rows stay in the same database file; VACUUM (SQLite only) returns
+# the freed pages to the filesystem, at the cost of rewriting the whole file
+RETENTION_VACUUM = os.getenv("RETENTION_VACUUM", "false").lower() == "true"
+
+def _text_bytes(column):
+    return func.coalesce(func.length(cast(column, LargeBinary)), 0)
+
+def database_size() -> Optional[Dict[str, int]]:
+    """Total and free bytes of the SQLite database file, None on other databases"""
+    if engine.dialect.name != "sqlite":
+        return None
+    with engine.connect() as connection:
+        page_size = connection.execute(text("PRAGMA page_size")).scalar()
+        page_count = connection.execute(text("PRAGMA page_count")).scalar()
+        freelist_count = connection.execute(text("PRAGMA freelist_count")).scalar()
+    return {"total_bytes": page_count * page_size, "free_bytes": freelist_count * page_size}
+
+def vacuum_database():
+    # VACUUM cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("VACUUM"))
+
+def archive_chat_messages(
+    db: Session,
+    older_than_days: int = CHAT_RETENTION_DAYS,
+    batch_size: int = RETENTION_BATCH_SIZE,
+    pause_seconds: float = RETENTION_BATCH_PAUSE_SECONDS,
+    stop: Optional[threading.Event] = None,
+    vacuum: bool = RETENTION_VACUUM
+) -> Dict[str, Any]:
+    """
+    Move chat messages older than the cutoff into archived_chat_messages,
+    one committed batch at a time. Returns a report of what was moved and,
+    on SQLite, of the database size before and after.
+    """
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    size_before = database_size()
+    rows_archived = 0
+    bytes_moved = 0
+    batches = 0
+
+    # Never archive the newest message: SQLite reuses rowids above the current
+    # maximum, and a reused id would collide with archived rows and their scores
+    max_id = db.query(func.max(ChatMessage.id)).scalar()
+
+    while max_id is not None and not (stop and stop.is_set()):
+        ids = [
+            row.id for row in db.query(ChatMessage.id).filter(
+                ChatMessage.created_at < cutoff,
+                ChatMessage.id < max_id
+            ).order_by(ChatMessage.id).limit(batch_size).all()
+        ]
+        if not ids:
+            break
+
+        batch_bytes = db.query(
+            func.sum(_text_bytes(ChatMessage.message) + _text_bytes(ChatMessage.response))
+        ).filter(ChatMessage.id.in_(ids)).scalar()
+        usernames = [
+            row.username for row in db.query(User.username).filter(
+                User.id.in_(select(ChatMessage.user_id).where(ChatMessage.id.in_(ids)))
+            ).all()
+        ]
+
+        db.execute(
+            insert(ArchivedChatMessage).from_select(
+                ["id", "message", "response", "created_at", "user_id"],
+                select(
+                    ChatMessage.id, ChatMessage.message, ChatMessage.response,
+                    ChatMessage.created_at, ChatMessage.user_id
+                ).where(ChatMessage.id.in_(ids))
+            )
+        )
+        db.execute(delete(ChatMessage).where(ChatMessage.id.in_(ids)))
+        db.commit()
+
+        # History responses for these users changed, so their ETags must too
+        for username in usernames:
+            bump_user_version(username)
+
+        rows_archived += len(ids)
+        bytes_moved += batch_bytes or 0
+        batches += 1
+        if len(ids) < batch_size:
+            break
+        time.sleep(pause_seconds)
+
+    if vacuum and rows_archived and size_before is not None:
+        vacuum_database()
+    size_after = database_size()
+
+    return {
+        "rows_archived": rows_archived,
+        "batches": batches,
+        # Text moved out of the hot table; without VACUUM the file does not shrink
+        "text_bytes_moved": bytes_moved,
+        "database_bytes_before": size_before and size_before["total_bytes"],
+        "database_bytes_after": size_after and size_after["total_bytes"],
+        "bytes_reclaimed": (
+            size_before["total_bytes"] - size_after["total_bytes"] if size_before else None
+        ),
+        "free_bytes_after": size_after and size_after["free_bytes"],
+        "cutoff": cutoff.isoformat(),
+        "duration_seconds": round(time.perf_counter() - started, 3)
+    }
+
+def run_retention(stop: Optional[threading.Event] = None) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        return archive_chat_messages(db, stop=stop)
+    finally:
+        db.close()
+
+async def retention_loop(stop: threading.Event):
+    """Archive old chat messages every RETENTION_INTERVAL_SECONDS until stopped"""
+    while not stop.is_set():
+        try:
+            report = await asyncio.to_thread(run_retention, stop)
+            if report["rows_archived"]:
+                print(f"Chat retention: {report}")
+        except Exception as e:
+            print(f"Error archiving chat messages: {e}")
+        await asyncio.sleep(RETENTION_INTERVAL_SECONDS)
+
+if __name__ == "__main__":
+    # One-off run, e.g. from cron: python retention.py
+    # ETag versions are only bumped in this process, so with the in-process
+    # version store prefer the app's background job (or set CACHE_REDIS_URL)
+    create_tables()
+    print(run_retention())
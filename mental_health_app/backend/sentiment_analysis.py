@@ -1,4 +1,3 @@
-from textblob import TextBlob
 from typing import Dict, Any
 import re
 
@@ -36,7 +35,8 @@ class SentimentAnalyzer:
         # Clean and prepare text
         cleaned_text = self._clean_text(text)
         
-        # TextBlob analysis
+        # TextBlob analysis (imported lazily, it pulls in NLTK)
+        from textblob import TextBlob
         blob = TextBlob(cleaned_text)
         polarity = blob.sentiment.polarity
         subjectivity = blob.sentiment.subjectivity
@@ -66,6 +66,10 @@ class SentimentAnalyzer:
             "keywords_found": keywords_found
         }
     
+    def warm_up(self):
+        """Import TextBlob and load its sentiment lexicon ahead of the first request"""
+        self.analyze_sentiment("warm up")
+    
     def _clean_text(self, text: str) -> str:
         """Clean and preprocess text"""
         # Remove URLs, mentions, hashtags
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# Configure the app before any backend module reads its environment
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_DATABASE_URL = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+os.environ["CHAT_RETENTION_DAYS"] = "0"
+
+sys.path.insert(0, BACKEND_DIR)
+
+@pytest.fixture(scope="session", autouse=True)
+def database():
+    from database import init_db
+    init_db()
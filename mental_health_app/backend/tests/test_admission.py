@@ -0,0 +1,85 @@
+import time
+import pytest
+from fastapi import HTTPException, Request
+from admission import (
+    AdmissionController, AdmissionPolicy, AdmissionStore, InMemoryAdmissionStore,
+    GLOBAL_MAX_IN_FLIGHT, _request_bytes
+)
+
+def test_incomplete_store_fails_at_construction():
+    class PartialStore(AdmissionStore):
+        def take_token(self, key, rate, burst):
+            return 0.0
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+def test_rate_limit_rejects_with_retry_after():
+    controller = AdmissionController(InMemoryAdmissionStore())
+    policy = AdmissionPolicy("test", rate=0.1, burst=2, max_concurrent=5)
+
+    for _ in range(2):
+        controller.release(controller.admit(policy, "user:1", 10))
+    with pytest.raises(HTTPException) as exc:
+        controller.admit(policy, "user:1", 10)
+    assert exc.value.status_code == 429
+    assert int(exc.value.headers["Retry-After"]) >= 1
+
+def test_concurrency_rejection_does_not_spend_a_token():
+    store = InMemoryAdmissionStore()
+    controller = AdmissionController(store)
+    policy = AdmissionPolicy("test", rate=0.001, burst=2, max_concurrent=1)
+
+    held = controller.admit(policy, "user:1", 10)
+    for _ in range(3):
+        with pytest.raises(HTTPException) as exc:
+            controller.admit(policy, "user:1", 10)
+        assert exc.value.detail == "Too many concurrent requests"
+    controller.release(held)
+
+    # The second token is still there
+    controller.release(controller.admit(policy, "user:1", 10))
+
+def test_global_limit_sheds_with_503():
+    controller = AdmissionController(InMemoryAdmissionStore())
+    policy = AdmissionPolicy("test", rate=100, burst=100, max_concurrent=100)
+
+    held = [controller.admit(policy, f"user:{i}", 10) for i in range(32)]
+    with pytest.raises(HTTPException) as exc:
+        controller.admit(policy, "user:extra", 10)
+    assert exc.value.status_code == 503
+    for keys in held:
+        controller.release(keys)
+
+def test_full_buckets_are_swept(monkeypatch):
+    monkeypatch.setattr("admission.BUCKET_SWEEP_SECONDS", 0)
+    store = InMemoryAdmissionStore()
+
+    store.take_token("client:1", rate=1000, burst=1)
+    store.take_token("client:2", rate=0.001, burst=1)
+    time.sleep(0.01)
+    store.take_token("client:3", rate=1000, burst=1)
+    assert "client:1" not in store._buckets
+    assert "client:2" in store._buckets
+
+def _request(method, query_string=b"", headers=()):
+    return Request({
+        "type": "http", "method": method, "path": "/", "query_string": query_string,
+        "headers": [(name.encode(), value.encode()) for name, value in headers]
+    })
+
+def test_get_requests_count_as_short():
+    controller = AdmissionController(InMemoryAdmissionStore())
+    policy = AdmissionPolicy("test", rate=100, burst=100, max_concurrent=100)
+
+    request_bytes = _request_bytes(_request("GET", b"days=30"))
+    assert request_bytes == 2
+    held = [controller.admit(policy, f"user:{i}", request_bytes) for i in range(GLOBAL_MAX_IN_FLIGHT)]
+    for keys in held:
+        controller.release(keys)
+
+def test_request_size_includes_query_text_and_body():
+    long_text = "a" * 1000
+    assert _request_bytes(_request("GET", f"text={long_text}".encode())) == 1000
+    assert _request_bytes(_request("POST", headers=[("content-length", "40")])) == 40
+    assert _request_bytes(_request("POST", headers=[("transfer-encoding", "chunked")])) is None
@@ -0,0 +1,81 @@
+import pytest
+from datetime import datetime, timedelta
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+import main
+from auth import create_access_token
+from caching import VersionStore, conditional_get
+from database import SessionLocal, User
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(main.app) as client:
+        db = SessionLocal()
+        db.add(User(username="etag_user", email="etag@example.com", hashed_password="x"))
+        db.commit()
+        db.close()
+        yield client
+
+@pytest.fixture
+def headers():
+    return {"Authorization": "Bearer " + create_access_token({"sub": "etag_user"})}
+
+def test_incomplete_store_fails_at_construction():
+    class PartialStore(VersionStore):
+        def get(self, key):
+            return 0
+
+    with pytest.raises(TypeError):
+        PartialStore()
+
+def test_unchanged_diary_returns_304(client, headers):
+    first = client.get("/diary", headers=headers)
+    etag = first.headers["ETag"]
+
+    second = client.get("/diary", headers={**headers, "If-None-Match": etag})
+    assert second.status_code == 304
+
+    # A different query is a different representation
+    other = client.get("/diary?limit=5", headers={**headers, "If-None-Match": etag})
+    assert other.status_code == 200
+
+def test_write_changes_etag(client, headers):
+    etag = client.get("/diary", headers=headers).headers["ETag"]
+    client.post("/diary", headers=headers, json={"title": "t", "content": "a calm day"})
+
+    response = client.get("/diary", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_per_day_etag_changes_with_the_day(headers, monkeypatch):
+    # As used by /emotions/trend, whose window moves without any write
+    app = FastAPI()
+
+    @app.get("/trend", dependencies=[Depends(conditional_get("trend", per_day=True))])
+    def trend():
+        return {}
+
+    client = TestClient(app)
+    etag = client.get("/trend", headers=headers).headers["ETag"]
+    assert client.get("/trend", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+    class Tomorrow(datetime):
+        @classmethod
+        def utcnow(cls):
+            return datetime.utcnow() + timedelta(days=1)
+
+    monkeypatch.setattr("caching.datetime", Tomorrow)
+    response = client.get("/trend", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_etags_disabled_when_not_shared(client, headers, monkeypatch):
+    monkeypatch.setattr("caching.CONDITIONAL_GET_ENABLED", False)
+    response = client.get("/diary", headers=headers)
+    assert "ETag" not in response.headers
+
+def test_static_resources_are_cacheable(client):
+    first = client.get("/resources")
+    assert "max-age" in first.headers["Cache-Control"]
+    second = client.get("/resources", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+import pytest
+from fastapi import WebSocketDisconnect
+from fastapi.testclient import TestClient
+import main
+from auth import create_access_token
+from database import SessionLocal, User, ChatMessage, EmotionScore
+
+async def fake_stream(message, history):
+    yield "You said "
+    yield message
+
+@pytest.fixture(scope="module")
+def client():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(main.gemini_service, "stream_response", fake_stream)
+        with TestClient(main.app) as client:
+            db = SessionLocal()
+            db.add(User(username="ws_user", email="ws@example.com", hashed_password="x"))
+            db.commit()
+            db.close()
+            yield client
+
+def auth_frame(**extra):
+    return {"type": "auth", "token": create_access_token({"sub": "ws_user"}), **extra}
+
+def receive_until(ws, frame_type):
+    while True:
+        frame = ws.receive_json()
+        if frame["type"] == frame_type:
+            return frame
+
+def test_message_is_streamed_and_persisted(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json(auth_frame())
+        assert ws.receive_json()["type"] == "session"
+
+        ws.send_json({"type": "message", "message": "I feel calm"})
+        assert ws.receive_json() == {"type": "chunk", "text": "You said "}
+        response = receive_until(ws, "response")
+        assert response["response"] == "You said I feel calm"
+        assert response["seq"] == 1
+
+    db = SessionLocal()
+    assert db.get(ChatMessage, response["chat_id"]).message == "I feel calm"
+    assert db.query(EmotionScore).filter(
+        EmotionScore.content_type == "chat",
+        EmotionScore.content_id == response["chat_id"]
+    ).count() == 1
+    db.close()
+
+def test_resume_replays_missed_responses(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json(auth_frame())
+        session_id = ws.receive_json()["session_id"]
+        ws.send_json({"type": "message", "message": "first"})
+        receive_until(ws, "response")
+
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json(auth_frame(session_id=session_id, last_seq=0))
+        assert ws.receive_json()["resumed"] is True
+        assert ws.receive_json()["response"] == "You said first"
+
+def test_reconnect_mid_stream_gets_the_response(client, monkeypatch):
+    gate = threading.Event()
+
+    async def slow_stream(message, history):
+        yield "You said "
+        while not gate.is_set():
+            await asyncio.sleep(0.01)
+        yield message
+
+    monkeypatch.setattr(main.gemini_service, "stream_response", slow_stream)
+    # The first connection is still open on the server when the client reconnects,
+    # as after a network blip that has not been noticed yet
+    with client.websocket_connect("/ws/chat") as first:
+        first.send_json(auth_frame())
+        session_id = first.receive_json()["session_id"]
+        first.send_json({"type": "message", "message": "still there?"})
+        assert first.receive_json() == {"type": "chunk", "text": "You said "}
+
+        with client.websocket_connect("/ws/chat") as second:
+            second.send_json(auth_frame(session_id=session_id, last_seq=0))
+            assert second.receive_json()["resumed"] is True
+            gate.set()
+            assert second.receive_json() == {"type": "chunk", "text": "still there?"}
+            assert receive_until(second, "response")["response"] == "You said still there?"
+
+def test_binary_and_malformed_frames_get_an_error(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json(auth_frame())
+        ws.receive_json()
+
+        ws.send_bytes(b"\xff\x00")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_bytes(b'{"type": "ping"}')
+        assert ws.receive_json() == {"type": "pong"}
+
+def test_invalid_token_is_rejected(client):
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"type": "auth", "token": "invalid"})
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+        assert exc.value.code == 1008
+
+def test_connection_closes_when_token_expires(client):
+    token = create_access_token({"sub": "ws_user"}, expires_delta=timedelta(seconds=2))
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        ws.receive_json()
+        started = time.monotonic()
+        with pytest.raises(WebSocketDisconnect) as exc:
+            while True:
+                ws.receive_json()
+        assert exc.value.code == 1008
+        assert time.monotonic() - started < 5
+
+def test_reauth_extends_the_connection(client):
+    token = create_access_token({"sub": "ws_user"}, expires_delta=timedelta(seconds=2))
+    with client.websocket_connect("/ws/chat") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        ws.receive_json()
+        ws.send_json(auth_frame())
+        assert ws.receive_json() == {"type": "auth_ok"}
+        time.sleep(2.5)
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
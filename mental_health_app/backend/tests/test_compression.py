@@ -0,0 +1,118 @@
+import random
+import pytest
+from sqlalchemy.dialects import postgresql, sqlite
+import compress_migration
+from compression import CompressedText, compress_text, decompress_text, active_dictionary_id
+from database import SessionLocal, User, DiaryEntry, ChatMessage, CompressionDictionary
+
+PHRASES = [
+    "I hear that you're feeling overwhelmed, and that is completely understandable.",
+    "It might help to try some deep breathing exercises.",
+    "Remember that reaching out to a mental health professional is a sign of strength.",
+    "Would you like to talk more about what is on your mind?",
+    "Journaling your thoughts can help you process them.",
+]
+
+@pytest.fixture(scope="module", autouse=True)
+def chat_rows(monkeypatch_module):
+    monkeypatch_module.setattr(compress_migration, "MIGRATION_BATCH_PAUSE_SECONDS", 0)
+    db = SessionLocal()
+    user = User(username="compression_user", email="compression@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+    rng = random.Random(0)
+    for i in range(300):
+        db.add(ChatMessage(
+            message=f"message {i}", response=" ".join(rng.sample(PHRASES, 4)), user_id=user.id
+        ))
+    db.commit()
+    db.close()
+
+@pytest.fixture(scope="module")
+def monkeypatch_module():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        yield monkeypatch
+
+def test_round_trip_with_and_without_dictionary():
+    text = " ".join(PHRASES * 3)
+    compressed = compress_text(text, force=True, dictionary_id=0)
+    assert isinstance(compressed, bytes)
+    assert decompress_text(compressed) == text
+    # Short and plain values are left alone
+    assert compress_text("short", force=True) == "short"
+    assert decompress_text("plain text") == "plain text"
+
+def test_storage_type_per_dialect():
+    column = CompressedText()
+    assert column.load_dialect_impl(sqlite.dialect()).__class__.__name__ == "Text"
+    assert column.load_dialect_impl(postgresql.dialect()).__class__.__name__ == "LargeBinary"
+    # Plain values are bound as UTF-8 bytes where the column is binary
+    assert column.process_bind_param("hello", postgresql.dialect()) == b"hello"
+    assert column.process_bind_param("hello", sqlite.dialect()) == "hello"
+
+def test_dry_run_matches_real_run_and_reruns_do_not_retrain():
+    dry = compress_migration.run_migration(dry_run=True)
+    assert dry["training"]["trained"]
+    assert active_dictionary_id() == 0
+
+    real = compress_migration.run_migration()
+    assert real["training"]["trained"]
+    assert real["bytes_after"] == dry["bytes_after"]
+    assert real["ratio"] < 0.5
+
+    dictionary_id = active_dictionary_id()
+    again = compress_migration.run_migration()
+    assert again["training"] is None
+    assert again["bytes_before"] == 0
+    assert active_dictionary_id() == dictionary_id
+
+    db = SessionLocal()
+    message = db.query(ChatMessage).filter(ChatMessage.message == "message 0").first()
+    assert any(message.response.startswith(phrase) for phrase in PHRASES)
+    db.close()
+
+def test_too_little_data_keeps_current_dictionary(monkeypatch):
+    dictionary_id = active_dictionary_id()
+    monkeypatch.setattr(compress_migration, "MIN_TRAINING_SAMPLES", 10 ** 6)
+
+    report = compress_migration.run_migration("train")
+    assert not report["training"]["trained"]
+    assert active_dictionary_id() == dictionary_id
+
+    db = SessionLocal()
+    active = db.query(CompressionDictionary).filter(CompressionDictionary.active == True).all()
+    assert [dictionary.id for dictionary in active] == [dictionary_id]
+    db.close()
+
+def test_edit_during_conversion_is_kept(monkeypatch):
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == "compression_user").first()
+    entry = DiaryEntry(title="Busy day", content=" ".join(PHRASES), user_id=user.id)
+    db.add(entry)
+    db.commit()
+    entry_id = entry.id
+    db.close()
+
+    edited = "Edited while the migration was running. " + " ".join(PHRASES)
+    compress = compress_migration.compress_text
+
+    def edit_then_compress(text, **kwargs):
+        # The row changes after the migration read it and before it writes
+        if text == " ".join(PHRASES):
+            other = SessionLocal()
+            other.query(DiaryEntry).filter(DiaryEntry.id == entry_id).update(
+                {DiaryEntry.content: edited}
+            )
+            other.commit()
+            other.close()
+        return compress(text, **kwargs)
+
+    monkeypatch.setattr(compress_migration, "compress_text", edit_then_compress)
+    db = SessionLocal()
+    report = compress_migration.compress_column(db, DiaryEntry, "content", dictionary_id=0)
+    db.close()
+    assert report["rows_converted"] == 0
+
+    db = SessionLocal()
+    assert db.query(DiaryEntry).filter(DiaryEntry.id == entry_id).first().content == edited
+    db.close()
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+from database import SessionLocal, User, ChatMessage, ArchivedChatMessage, EmotionScore
+from retention import archive_chat_messages
+
+def test_old_messages_move_to_archive_with_scores_linked():
+    db = SessionLocal()
+    user = User(username="retention_user", email="retention@example.com", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    old_ids = []
+    for days_ago in (200, 150, 120, 1):
+        message = ChatMessage(
+            message="hello " * 50,
+            response="response " * 200,
+            user_id=user.id,
+            created_at=datetime.utcnow() - timedelta(days=days_ago)
+        )
+        db.add(message)
+        db.flush()
+        db.add(EmotionScore(score=0.1, content_type="chat", content_id=message.id, user_id=user.id))
+        if days_ago > 90:
+            old_ids.append(message.id)
+    db.commit()
+
+    report = archive_chat_messages(db, older_than_days=90, batch_size=2, pause_seconds=0, vacuum=True)
+
+    assert report["rows_archived"] == 3
+    assert report["batches"] == 2
+    assert report["text_bytes_moved"] > 0
+    assert report["bytes_reclaimed"] is not None
+    assert db.query(ChatMessage).filter(ChatMessage.user_id == user.id).count() == 1
+    archived = db.query(ArchivedChatMessage).filter(ArchivedChatMessage.user_id == user.id).all()
+    assert sorted(message.id for message in archived) == old_ids
+    # Scores still point at the archived messages by id
+    linked = db.query(EmotionScore).filter(
+        EmotionScore.content_type == "chat",
+        EmotionScore.content_id.in_(old_ids)
+    ).count()
+    assert linked == 3
+    db.close()
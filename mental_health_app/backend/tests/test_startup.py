@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from fastapi.testclient import TestClient
+from conftest import BACKEND_DIR
+import health
+from health import HealthRegistry, IMPORT_BUDGET_SECONDS, STARTUP_BUDGET_SECONDS
+
+def test_import_time_within_budget():
+    # A fresh interpreter, so nothing is already imported by other tests
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import json, main; print(json.dumps(main.health_registry.import_time))"
+        ],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    import_time = json.loads(result.stdout.strip().splitlines()[-1])
+    assert import_time is not None
+    assert import_time <= IMPORT_BUDGET_SECONDS
+
+def test_heavy_modules_not_imported_eagerly():
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys, main; "
+            "print(any(m in sys.modules for m in ('google.generativeai', 'textblob', 'passlib')))"
+        ],
+        cwd=BACKEND_DIR,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    assert result.stdout.strip().splitlines()[-1] == "False"
+
+def test_startup_within_budget_and_ready():
+    import main
+
+    with TestClient(main.app) as client:
+        assert client.get("/health/live").status_code == 200
+
+        deadline = time.monotonic() + STARTUP_BUDGET_SECONDS
+        report = client.get("/health/ready").json()
+        while report["timings"]["startup_seconds"] is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            report = client.get("/health/ready").json()
+
+        assert report["timings"]["startup_seconds"] is not None
+        assert report["timings"]["startup_seconds"] <= STARTUP_BUDGET_SECONDS
+        response = client.get("/health/ready")
+        assert response.status_code == 200, response.json()
+
+def test_failed_warm_up_is_retried(monkeypatch):
+    monkeypatch.setattr(health, "WARM_UP_RETRY_SECONDS", 0)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("database is locked")
+
+    registry = HealthRegistry()
+    registry.register("database", flaky)
+    asyncio.run(registry.warm_up_all())
+    assert not registry.is_ready()
+
+    asyncio.run(registry.retry_failed())
+    assert registry.is_ready()
+    assert registry.report()["subsystems"]["database"]["attempts"] == 3
+
+def test_liveness_fails_after_warm_up_attempts_run_out(monkeypatch):
+    import main
+
+    def broken():
+        raise RuntimeError("broken")
+
+    registry = HealthRegistry()
+    registry.register("database", broken)
+    registry.register("optional", broken, required=False)
+    monkeypatch.setattr(main, "health_registry", registry)
+    for _ in range(health.WARM_UP_MAX_ATTEMPTS - 1):
+        registry.subsystems["database"].run()
+        registry.subsystems["optional"].run()
+    assert main.liveness() == {"status": "alive"}
+
+    registry.subsystems["database"].run()
+    assert main.liveness().status_code == 503